@@ -4,20 +4,24 @@ Automates generation of app icons, splash screens and native app identifiers for
 Usage: python tools/generate_branding.py <flavor>
 Steps:
  1. Clean previous assets (Android mipmaps, iOS AppIcon and LaunchImage asset catalogs)
- 2. Copy and validate icon, background, splash images from assets/configs/<flavor>/
+ 2. Validate icon, background, splash images in assets/configs/<flavor>/
  3. Update pubspec.yaml entries for flutter_launcher_icons and flutter_native_splash
  4. Generate flavor-specific YAML configs and run Dart commands to produce assets
  5. Update native package names and display names in Android and iOS
- 6. Clean up temporary files and verify iOS asset catalogs
+ 6. Verify iOS asset catalogs
 """
 import argparse
+import errno
+import io
 import json
 import logging
 import re
 import shutil
+import struct
 import subprocess
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from PIL import Image
@@ -48,40 +52,119 @@ SPLASH_DIMENSIONS = {
     }
 }
 
+# Lado máximo que generan los plugins a partir del icono (App Store / adaptive icon)
+ICON_SOURCE_SIZE = ICON_DIMENSIONS['ios']['app_store']
+
+# Ejecutable de Dart resuelto una sola vez (evita la búsqueda en PATH por proceso)
+DART = shutil.which('dart')
+
+# Hilos para solapar los rmtree/rename de las carpetas mipmap
+MOVE_WORKERS = 8
+
 # Project paths
 PROJECT_ROOT = Path(__file__).parent.parent.resolve()
 ANDROID_RES_DEFAULT = PROJECT_ROOT / 'android' / 'app' / 'src' / 'main' / 'res'
 IOS_ASSETS = PROJECT_ROOT / 'ios' / 'Runner' / 'Assets.xcassets'
 PUBSPEC = PROJECT_ROOT / 'pubspec.yaml'
 CONFIG_BASE = PROJECT_ROOT / 'assets' / 'configs'
+BRANDING_CACHE = PROJECT_ROOT / '.branding_cache.json'
+# Archivos generados: .dart_tool/ ya está ignorado por git en los proyectos Flutter
+PRESCALED_DIR = PROJECT_ROOT / '.dart_tool' / 'flow_branding'
 AndroidManifest = PROJECT_ROOT / 'android' / 'app' / 'src' / 'main' / 'AndroidManifest.xml'
 AndroidGradle = PROJECT_ROOT / 'android' / 'app' / 'build.gradle.kts'
 iOSInfoPlist = PROJECT_ROOT / 'ios' / 'Runner' / 'Info.plist'
 
+# Firma PNG y cabecera IHDR (siempre el primer chunk)
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_IHDR = b'IHDR'
+
+# Patrones precompilados para los archivos nativos (se trabajan como bytes)
+MANIFEST_RE = re.compile(rb'(package)="[^"]+"|(android:label)="[^"]+"')
+GRADLE_APP_ID_RE = re.compile(rb'applicationId\s*=\s*"[^"]+"')
+PLIST_BUNDLE_KEYS_RE = re.compile(
+    rb'<key>(CFBundleIdentifier|CFBundleDisplayName)</key>\s*<string>[^<]+</string>')
+PLIST_DISPLAY_NAME_KEY = b'<key>CFBundleDisplayName</key>'
+
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
-def validate_image_dimensions(image_path: Path, required_dimensions: tuple, name: str):
+def read_image_size(image_path: Path):
+    """Lee el tamaño de una imagen; para PNG lo toma del IHDR sin decodificarla"""
+    with image_path.open('rb') as f:
+        header = f.read(24)
+    if header[:8] == PNG_SIGNATURE and header[12:16] == PNG_IHDR:
+        return struct.unpack('>II', header[16:24])
+    with Image.open(image_path) as img:
+        return img.size
+
+def load_branding_cache() -> dict:
+    """Carga el cache de dimensiones de imágenes validadas en ejecuciones anteriores"""
+    try:
+        cache = json.loads(BRANDING_CACHE.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+    # Un cache con otra forma se descarta: nunca debe hacer fallar la validación
+    return cache if isinstance(cache, dict) else {}
+
+def save_branding_cache(cache: dict):
+    try:
+        BRANDING_CACHE.write_text(json.dumps(cache, indent=2), encoding='utf-8')
+    except OSError as e:
+        logging.warning(f'No se pudo guardar {BRANDING_CACHE.name}: {str(e)}')
+
+def cached_image_size(image_path: Path, cache: dict):
+    """Tamaño de la imagen; solo se lee si cambió su mtime o tamaño desde la última ejecución"""
+    st = image_path.stat()
+    key = str(image_path)
+    entry = cache.get(key)
+    if (isinstance(entry, dict)
+            and entry.get('mtime_ns') == st.st_mtime_ns
+            and entry.get('size') == st.st_size
+            and isinstance(entry.get('width'), int)
+            and isinstance(entry.get('height'), int)):
+        return entry['width'], entry['height']
+    width, height = read_image_size(image_path)
+    cache[key] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'width': width, 'height': height}
+    return width, height
+
+def validate_image_dimensions(image_path: Path, required_dimensions: tuple, name: str, cache: dict):
     """Valida las dimensiones de una imagen"""
     try:
-        with Image.open(image_path) as img:
-            width, height = img.size
-            if isinstance(required_dimensions, tuple):
-                min_width, min_height = required_dimensions
-                if width < min_width or height < min_height:
-                    logging.error(f'❌ {name} debe tener dimensiones mínimas de {min_width}x{min_height}px (actual: {width}x{height}px)')
-                    return False
-            else:
-                if width < required_dimensions or height < required_dimensions:
-                    logging.error(f'❌ {name} debe tener dimensiones mínimas de {required_dimensions}x{required_dimensions}px (actual: {width}x{height}px)')
-                    return False
-                if width != height:
-                    logging.error(f'❌ {name} debe ser cuadrada ({width}x{height}px)')
-                    return False
-            return True
+        width, height = cached_image_size(image_path, cache)
+        if isinstance(required_dimensions, tuple):
+            min_width, min_height = required_dimensions
+            if width < min_width or height < min_height:
+                logging.error(f'❌ {name} debe tener dimensiones mínimas de {min_width}x{min_height}px (actual: {width}x{height}px)')
+                return False
+        else:
+            if width < required_dimensions or height < required_dimensions:
+                logging.error(f'❌ {name} debe tener dimensiones mínimas de {required_dimensions}x{required_dimensions}px (actual: {width}x{height}px)')
+                return False
+            if width != height:
+                logging.error(f'❌ {name} debe ser cuadrada ({width}x{height}px)')
+                return False
+        return True
+    except FileNotFoundError:
+        logging.error(f'❌ No se encontró {name} en el directorio del flavor')
+        return False
     except Exception as e:
         logging.error(f'❌ Error al validar {name}: {str(e)}')
         return False
 
+def move_path(src: Path, dest: Path):
+    """Mueve con un único rename(); shutil.move solo si cruza sistemas de archivos"""
+    try:
+        os.replace(src, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(str(src), str(dest))
+
+def replace_dir(src: Path, dest: Path):
+    """Reemplaza dest por src, eliminando antes el contenido previo de dest"""
+    if dest.exists():
+        shutil.rmtree(dest)
+    move_path(src, dest)
+
 def clean_previous_app_data():
     """Limpia los datos de las apps anteriores en Android e iOS"""
     logging.info('Limpiando datos de apps anteriores...')
@@ -113,53 +196,56 @@ def clean_previous_app_data():
 def clean_previous_assets(android_res_path, flavor: str):
     logging.info('Limpiando assets anteriores...')
     if android_res_path.exists():
-        for child in android_res_path.iterdir():
-            if child.is_dir() and 'mipmap' in child.name:
-                shutil.rmtree(child, ignore_errors=True)
+        # DirEntry.is_dir() usa el d_type de getdents, sin stat por entrada
+        with os.scandir(android_res_path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and 'mipmap' in entry.name:
+                    shutil.rmtree(entry.path, ignore_errors=True)
     
     # Limpiar assets de iOS principales (que se generan por defecto)
     for folder in (IOS_ASSETS / 'AppIcon.appiconset', IOS_ASSETS / 'LaunchImage.imageset'):
-        if folder.exists():
-            shutil.rmtree(folder, ignore_errors=True)
+        shutil.rmtree(folder, ignore_errors=True)
         folder.mkdir(parents=True, exist_ok=True)
 
-def validate_and_copy_images(flavor_dir: Path):
-    """Valida y copia las imágenes necesarias para el branding"""
-    logging.info('Validando y copiando imágenes...')
+def validate_images(flavor_dir: Path, cache: dict):
+    """Valida las imágenes necesarias para el branding"""
+    logging.info('Validando imágenes...')
     
-    # Validar y copiar icono
+    # Validar icono
     icon_path = flavor_dir / 'icon.png'
-    if not icon_path.exists():
-        logging.error('❌ No se encontró icon.png en el directorio del flavor')
+    if not validate_image_dimensions(icon_path, ICON_DIMENSIONS['android']['adaptive_icon'], 'icon.png', cache):
         sys.exit(1)
     
-    if not validate_image_dimensions(icon_path, ICON_DIMENSIONS['android']['adaptive_icon'], 'icon.png'):
-        sys.exit(1)
-    
-    # Validar y copiar splash
+    # Validar splash
     splash_path = flavor_dir / 'splash.png'
-    if not splash_path.exists():
-        logging.error('❌ No se encontró splash.png en el directorio del flavor')
+    if not validate_image_dimensions(splash_path, SPLASH_DIMENSIONS['android']['portrait'], 'splash.png', cache):
         sys.exit(1)
     
-    if not validate_image_dimensions(splash_path, SPLASH_DIMENSIONS['android']['portrait'], 'splash.png'):
-        sys.exit(1)
-    
-    # Copiar archivos al directorio raíz
-    shutil.copy(icon_path, PROJECT_ROOT / 'icon.png')
-    shutil.copy(splash_path, PROJECT_ROOT / 'splash.png')
-    logging.info('✅ Imágenes validadas y copiadas correctamente')
+    logging.info('✅ Imágenes validadas correctamente')
 
-def generate_pubspec_assets(flavor_dir: Path):
+def load_pubspec():
+    """Parsea pubspec.yaml en modo round-trip (conserva comentarios y comillas)"""
     yaml = YAML()
     yaml.preserve_quotes = True
-    data = yaml.load(PUBSPEC)
+    original = PUBSPEC.read_text(encoding='utf-8')
+    return yaml, yaml.load(original), original
+
+def save_pubspec(yaml: YAML, data, original: str) -> bool:
+    """Escribe pubspec.yaml solo si el contenido cambió; devuelve si lo escribió"""
+    buffer = io.StringIO()
+    yaml.dump(data, buffer)
+    content = buffer.getvalue()
+    if content == original:
+        logging.info('✅ pubspec.yaml ya estaba actualizado')
+        return False
+    PUBSPEC.write_text(content, encoding='utf-8')
+    logging.info('✅ Actualizado pubspec.yaml')
+    return True
+
+def mutate_pubspec_assets(data, flavor_dir: Path, config: dict):
+    """Agrega los assets del flavor al árbol de pubspec.yaml"""
     assets = data.setdefault('flutter', {}).setdefault('assets', [])
     
-    # Leer el archivo config.json
-    with (flavor_dir / 'config.json').open('r', encoding='utf-8') as f:
-        config = json.load(f)
-    
     # Agregar assets del flavor
     flavor_assets = [
         f'assets/configs/{flavor_dir.name}/icon.png',
@@ -175,24 +261,20 @@ def generate_pubspec_assets(flavor_dir: Path):
     for asset in config.get('assets', []):
         if asset not in assets:
             assets.append(asset)
-    
-    with PUBSPEC.open('w') as f:
-        yaml.dump(data, f)
-    logging.info('✅ Actualizado pubspec.yaml con los assets')
 
-def update_pubspec(main_color: str, has_splash: bool):
-    yaml = YAML()
-    yaml.preserve_quotes = True
-    data = yaml.load(PUBSPEC)
+def mutate_pubspec_branding(data, flavor: str, main_color: str, has_splash: bool):
+    """Configura flutter_launcher_icons y flutter_native_splash en el árbol de pubspec.yaml"""
+    icon_path = f'assets/configs/{flavor}/icon.png'
+    splash_path = f'assets/configs/{flavor}/splash.png'
     
     # Configurar flutter_launcher_icons
     icons = data.setdefault('flutter_launcher_icons', {})
     icons.update({
         'android': True,
         'ios': True,
-        'image_path_ios': 'icon.png',
+        'image_path_ios': icon_path,
         'adaptive_icon_background': main_color,
-        'adaptive_icon_foreground': 'icon.png',
+        'adaptive_icon_foreground': icon_path,
         'remove_alpha_ios': True,
         'min_sdk_android': 21,
         'web': False,
@@ -203,19 +285,15 @@ def update_pubspec(main_color: str, has_splash: bool):
     splash = data.setdefault('flutter_native_splash', {})
     splash.update({
         'color': main_color,
-        'image': 'splash.png',
+        'image': splash_path,
         'android_12': {
-            'image': 'splash.png',
+            'image': splash_path,
             'icon_background_color': main_color
         },
         'ios': True,
         'android': True,
         'web': False
     })
-    
-    with PUBSPEC.open('w') as f:
-        yaml.dump(data, f)
-    logging.info('✅ Actualizado pubspec.yaml con la configuración de branding')
 
 def move_assets_to_flavor(flavor: str, android_res_path: Path):
     """Mueve los assets generados desde src/main/res a la carpeta específica del flavor"""
@@ -227,13 +305,21 @@ def move_assets_to_flavor(flavor: str, android_res_path: Path):
     android_res_path.mkdir(parents=True, exist_ok=True)
     
     # Mover carpetas de mipmap (iconos) - solo si existen
-    for mipmap_dir in main_res.glob('mipmap-*'):
-        if mipmap_dir.is_dir() and mipmap_dir.exists():
-            dest_dir = android_res_path / mipmap_dir.name
-            if dest_dir.exists():
-                shutil.rmtree(dest_dir)
-            shutil.move(str(mipmap_dir), str(dest_dir))
-            logging.info(f'✅ Movido {mipmap_dir.name}')
+    mipmap_dirs = []
+    if main_res.exists():
+        with os.scandir(main_res) as entries:
+            mipmap_dirs = [
+                Path(entry.path) for entry in entries
+                if entry.name.startswith('mipmap-') and entry.is_dir(follow_symlinks=False)
+            ]
+    with ThreadPoolExecutor(max_workers=MOVE_WORKERS) as executor:
+        futures = {
+            executor.submit(replace_dir, mipmap_dir, android_res_path / mipmap_dir.name): mipmap_dir
+            for mipmap_dir in mipmap_dirs
+        }
+    for future, mipmap_dir in futures.items():
+        future.result()
+        logging.info(f'✅ Movido {mipmap_dir.name}')
     
     # Mover archivos de configuración - solo si existen
     config_files = [
@@ -248,33 +334,91 @@ def move_assets_to_flavor(flavor: str, android_res_path: Path):
     
     for config_file in config_files:
         src_file = main_res / config_file
-        if src_file.exists():
-            dest_file = android_res_path / config_file
+        dest_file = android_res_path / config_file
+        try:
+            move_path(src_file, dest_file)
+        except FileNotFoundError:
+            # Solo en el caso raro se distingue entre origen ausente y carpeta destino ausente
+            if not src_file.exists():
+                continue
             dest_file.parent.mkdir(parents=True, exist_ok=True)
-            shutil.move(str(src_file), str(dest_file))
-            logging.info(f'✅ Movido {config_file}')
+            move_path(src_file, dest_file)
+        logging.info(f'✅ Movido {config_file}')
     
     logging.info(f'✅ Assets movidos a {android_res_path}')
 
-def generate_and_run(flavor: str, main_color: str):
+def prescale_icon(icon_path: Path, cache: dict) -> Path:
+    """Reduce el icono al tamaño máximo que necesitan los generadores de Dart.
+    
+    Si la fuente ya mide ICON_SOURCE_SIZE se usa tal cual; si es mayor se deja una
+    copia reducida en PRESCALED_DIR, para que Dart no decodifique y redimensione la
+    imagen completa en cada tamaño de salida. La copia se regenera cuando cambian el
+    mtime o el tamaño de la fuente, tomados de la entrada que validate_images dejó en
+    el cache (así no se vuelve a leer ni a hacer stat de la fuente).
+    """
+    source = cache.get(str(icon_path))
+    if not isinstance(source, dict):
+        cached_image_size(icon_path, cache)
+        source = cache[str(icon_path)]
+    width, height = source['width'], source['height']
+    if width <= ICON_SOURCE_SIZE and height <= ICON_SOURCE_SIZE:
+        return icon_path
+    
+    prescaled = PRESCALED_DIR / icon_path.parent.name / f'{icon_path.stem}_prescaled.png'
+    entry = cache.get(str(prescaled))
+    if (isinstance(entry, dict)
+            and entry.get('source_mtime_ns') == source['mtime_ns']
+            and entry.get('source_size') == source['size']
+            and prescaled.exists()):
+        return prescaled
+    
+    factor, remainder = divmod(width, ICON_SOURCE_SIZE)
+    try:
+        with Image.open(icon_path) as img:
+            if img.mode in ('P', '1'):
+                # Con paleta Pillow ignora el filtro y usa NEAREST: se remuestrea en RGBA
+                img = img.convert('RGBA')
+            elif img.mode.startswith('I;16'):
+                # Escala de grises de 16 bits: reduce/resize no la soportan, se pasa a 8 bits
+                img = img.convert('I').point(lambda value: value / 256).convert('L')
+            if remainder == 0 and width == height:
+                # Factor entero (p. ej. 2048 -> 1024): promedio exacto por bloques
+                resized = img.reduce(factor)
+            else:
+                # Primero se reduce por el mayor factor entero y Lanczos solo ajusta el resto
+                resized = img.resize((ICON_SOURCE_SIZE, ICON_SOURCE_SIZE), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            prescaled.parent.mkdir(parents=True, exist_ok=True)
+            resized.save(prescaled)
+    except (OSError, ValueError) as e:
+        # Reducir es solo una optimización: ante un modo no soportado se usa la fuente
+        logging.warning(f'No se pudo reducir {icon_path.name}, se usa el original: {str(e)}')
+        prescaled.unlink(missing_ok=True)
+        return icon_path
+    cache[str(prescaled)] = {'source_mtime_ns': source['mtime_ns'], 'source_size': source['size']}
+    logging.info(f'✅ Icono reducido a {ICON_SOURCE_SIZE}x{ICON_SOURCE_SIZE}px ({prescaled.name})')
+    return prescaled
+
+def generate_and_run(flavor: str, main_color: str, pubspec_changed: bool, cache: dict):
     """Genera y ejecuta los comandos para crear los assets"""
     flavor_cfg = CONFIG_BASE / flavor
+    icon_source = prescale_icon(flavor_cfg / 'icon.png', cache).relative_to(PROJECT_ROOT).as_posix()
+    yaml = YAML()
     
     # Generar configuración para flutter_launcher_icons (Android e iOS)
     icons_cfg = {
         'flutter_launcher_icons': {
             'android': True,
             'ios': True,  # Habilitar iOS
-            'image_path': f'assets/configs/{flavor}/icon.png',
+            'image_path': icon_source,
             'min_sdk_android': 21,
             'adaptive_icon_background': main_color,
-            'adaptive_icon_foreground': f'assets/configs/{flavor}/icon.png',
+            'adaptive_icon_foreground': icon_source,
             'background_color_ios': main_color,  # Color de fondo para iOS
             'remove_alpha_ios': True  # Remover canal alpha para iOS
         }
     }
     icons_yaml = flavor_cfg / f'flutter_launcher_icons-{flavor}.yaml'
-    YAML().dump(icons_cfg, icons_yaml.open('w'))
+    yaml.dump(icons_cfg, icons_yaml)
     logging.info(f'✅ Generado {icons_yaml.name}')
     
     # Generar configuración para flutter_native_splash (Android e iOS)
@@ -292,65 +436,93 @@ def generate_and_run(flavor: str, main_color: str):
         }
     }
     splash_yaml = flavor_cfg / f'flutter_native_splash-{flavor}.yaml'
-    YAML().dump(splash_cfg, splash_yaml.open('w'))
+    yaml.dump(splash_cfg, splash_yaml)
     logging.info(f'✅ Generado {splash_yaml.name}')
     
-    # Ejecutar comandos desde el directorio raíz
-    original_dir = Path.cwd()
-    try:
-        os.chdir(PROJECT_ROOT)
-        
-        # Generar iconos
-        subprocess.run([
-            'dart', 'run', 'flutter_launcher_icons',
+    if DART is None:
+        logging.error('❌ No se encontró el ejecutable dart en el PATH')
+        sys.exit(1)
+    
+    # Si save_pubspec reescribió pubspec.yaml queda más nuevo que pubspec.lock y cada
+    # `dart run` resolvería dependencias a la vez: se resuelven una sola vez antes
+    if pubspec_changed:
+        try:
+            subprocess.run([DART, 'pub', 'get'], cwd=PROJECT_ROOT, check=True)
+        except subprocess.CalledProcessError as e:
+            logging.error(f'❌ Error al resolver dependencias: {str(e)}')
+            sys.exit(1)
+    
+    # Ejecutar comandos desde el directorio raíz. Los dos generadores escriben en
+    # carpetas distintas (mipmaps/AppIcon vs. splash), así que corren en paralelo
+    commands = [
+        ('✅ Iconos generados correctamente', [
+            DART, 'run', 'flutter_launcher_icons',
             '-f', str(icons_yaml),
-        ], check=True)
-        logging.info('✅ Iconos generados correctamente')
-        
-        # Generar splash screen
-        subprocess.run([
-            'dart', 'run', 'flutter_native_splash:create',
+        ]),
+        ('✅ Splash screen generado correctamente', [
+            DART, 'run', 'flutter_native_splash:create',
             f'--path={splash_yaml}'
-        ], check=True)
-        logging.info('✅ Splash screen generado correctamente')
-        
-    except subprocess.CalledProcessError as e:
-        logging.error(f'❌ Error al generar assets: {str(e)}')
-        sys.exit(1)
+        ]),
+    ]
+    
+    processes = []
+    failed = False
+    try:
+        for success_message, command in commands:
+            processes.append((success_message, subprocess.Popen(command, cwd=PROJECT_ROOT)))
     finally:
-        os.chdir(original_dir)
+        # Esperar siempre a los procesos ya lanzados, aunque falle un Popen posterior
+        for success_message, process in processes:
+            returncode = process.wait()
+            if returncode != 0:
+                error = subprocess.CalledProcessError(returncode, process.args)
+                logging.error(f'❌ Error al generar assets: {str(error)}')
+                failed = True
+            else:
+                logging.info(success_message)
+    
+    if failed:
+        sys.exit(1)
 
 def update_android_config(package_name: str, app_name: str):
+    package = package_name.encode('utf-8')
+    label = app_name.encode('utf-8')
     if AndroidManifest.exists():
-        text = AndroidManifest.read_text(encoding='utf-8')
-        text = re.sub(r'package="[^"]+"', f'package="{package_name}"', text)
-        text = re.sub(r'android:label="[^"]+"', f'android:label="{app_name}"', text)
-        AndroidManifest.write_text(text, encoding='utf-8')
+        text = AndroidManifest.read_bytes()
+        # package y android:label en una sola pasada
+        text = MANIFEST_RE.sub(
+            lambda m: b'package="' + package + b'"' if m.lastindex == 1 else b'android:label="' + label + b'"',
+            text)
+        AndroidManifest.write_bytes(text)
         logging.info('✅ Actualizado AndroidManifest.xml')
     
     if AndroidGradle.exists():
-        text = AndroidGradle.read_text(encoding='utf-8')
-        text = re.sub(r'applicationId\s*=\s*"[^"]+"', f'applicationId = "{package_name}"', text)
-        AndroidGradle.write_text(text, encoding='utf-8')
+        text = AndroidGradle.read_bytes()
+        text = GRADLE_APP_ID_RE.sub(lambda m: b'applicationId = "' + package + b'"', text)
+        AndroidGradle.write_bytes(text)
         logging.info('✅ Actualizado build.gradle.kts')
 
 def update_ios_config(package_name: str, app_name: str):
     if iOSInfoPlist.exists():
-        content = iOSInfoPlist.read_text(encoding='utf-8')
-        content = re.sub(
-            r'<key>CFBundleIdentifier</key>\s*<string>[^<]+</string>',
-            f'<key>CFBundleIdentifier</key>\n\t<string>{package_name}</string>', content)
+        values = {
+            b'CFBundleIdentifier': package_name.encode('utf-8'),
+            b'CFBundleDisplayName': app_name.encode('utf-8'),
+        }
+        content = iOSInfoPlist.read_bytes()
+        has_display_name = PLIST_DISPLAY_NAME_KEY in content
         
-        if '<key>CFBundleDisplayName</key>' in content:
-            content = re.sub(
-                r'<key>CFBundleDisplayName</key>\s*<string>[^<]+</string>',
-                f'<key>CFBundleDisplayName</key>\n\t<string>{app_name}</string>', content)
-        else:
-            content = re.sub(
-                r'(<key>CFBundleIdentifier</key>\s*<string>[^<]+</string>)',
-                r"\1\n\t<key>CFBundleDisplayName</key>\n\t<string>" + app_name + "</string>", content)
+        def replace_entry(match):
+            key = match.group(1)
+            entry = b'<key>' + key + b'</key>\n\t<string>' + values[key] + b'</string>'
+            if key == b'CFBundleIdentifier' and not has_display_name:
+                # Si falta CFBundleDisplayName se inserta justo después del identificador
+                entry += b'\n\t<key>CFBundleDisplayName</key>\n\t<string>' + values[b'CFBundleDisplayName'] + b'</string>'
+            return entry
         
-        iOSInfoPlist.write_text(content, encoding='utf-8')
+        # Identificador y nombre visible en una sola pasada
+        content = PLIST_BUNDLE_KEYS_RE.sub(replace_entry, content)
+        
+        iOSInfoPlist.write_bytes(content)
         logging.info('✅ Actualizado Info.plist')
 
 def verify_ios_assets(flavor: str):
@@ -382,29 +554,37 @@ def main():
         logging.error(f'❌ Config no encontrado: {config_file}')
         sys.exit(1)
     
-    config = json.loads(config_file.read_text())
+    config = json.loads(config_file.read_text(encoding='utf-8'))
     main_color = '#' + config.get('mainColor', '').lstrip('#')
     app_name = config.get('appName', flavor.capitalize())
     package_name = f"com.giolabs.{flavor}"
 
+    # Cache de dimensiones/reducciones compartido por los pasos; se guarda una sola vez
+    branding_cache = load_branding_cache()
+    branding_cache_snapshot = dict(branding_cache)
+
     # Ejecutar pasos en orden
     clean_previous_app_data()
     clean_previous_assets(android_res_path, flavor)
-    validate_and_copy_images(CONFIG_BASE / flavor)
-    generate_pubspec_assets(CONFIG_BASE / flavor)
-    update_pubspec(main_color, (PROJECT_ROOT / 'splash.png').exists())
-    generate_and_run(flavor, main_color)
+    validate_images(CONFIG_BASE / flavor, branding_cache)
+    yaml, pubspec, pubspec_text = load_pubspec()
+    mutate_pubspec_assets(pubspec, CONFIG_BASE / flavor, config)
+    mutate_pubspec_branding(pubspec, flavor, main_color, (CONFIG_BASE / flavor / 'splash.png').exists())
+    pubspec_changed = save_pubspec(yaml, pubspec, pubspec_text)
+    generate_and_run(flavor, main_color, pubspec_changed, branding_cache)
+    if branding_cache != branding_cache_snapshot:
+        save_branding_cache(branding_cache)
     move_assets_to_flavor(flavor, android_res_path)
-    update_android_config(package_name, app_name)
-    update_ios_config(package_name, app_name)
-    verify_ios_assets(flavor)
-
-    # Limpiar archivos temporales
-    for tmp in ['icon.png', 'splash.png']:
-        p = PROJECT_ROOT / tmp
-        if p.exists():
-            p.unlink()
-    logging.info('✅ Archivos temporales limpiados')
+
+    # Pasos independientes: tocan archivos disjuntos
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(update_android_config, package_name, app_name),
+            executor.submit(update_ios_config, package_name, app_name),
+            executor.submit(verify_ios_assets, flavor),
+        ]
+    for future in futures:
+        future.result()
 
     logging.info(f'✅ Branding completado para flavor `{flavor}` con app `{app_name}` y package `{package_name}`')
 